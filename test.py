@@ -2,15 +2,24 @@
 
 import time
 import logging
+import re
 import random
 import sys
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import threading
+from collections import deque
+from concurrent.futures import Future
 import signal
+import socket
 import os
 import json
-import urllib.request
-import urllib.error
+import http.client
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,150 +27,311 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def fetch_api_data(endpoint):
+def _env_flag(name, default):
+    """Read a boolean flag from the environment; unset or empty means default"""
+    value = os.environ.get(name, '').strip().lower()
+    if not value:
+        return default
+    return value not in ('0', 'false', 'no', 'off')
+
+# Extra startup details are only logged when GEMSTONE_TEST_VERBOSE is set
+VERBOSE = _env_flag('GEMSTONE_TEST_VERBOSE', False)
+
+# Random crashes exercise auto-restart; set GEMSTONE_TEST_CRASH=0 to disable
+SIMULATE_CRASHES = _env_flag('GEMSTONE_TEST_CRASH', True)
+
+# Set when main() exits, e.g. on SIGTERM/SIGINT, to stop the worker loop
+_STOP = threading.Event()
+
+# Static parts of the test app response
+GREETING = b'Hello from Gemstone test app!\n'
+HDR_INFO = b'\n--- Gemstone Daemon Info ---\n'
+HDR_PROCS = b'\n--- Managed Processes ---\n'
+NO_PROCS = b'No processes currently managed\n'
+UNAVAIL_SYS = b'Unable to fetch system info from API\n'
+UNAVAIL_PROCS = b'Unable to fetch processes from API\n'
+PID_LINE = f'PID: {os.getpid()}\n'.encode()
+
+# Date and time part of an ISO 8601 timestamp
+_TS_RE = re.compile(r'(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})')
+
+API_HOST = '127.0.0.1'
+API_PORT = 9876
+API_POOL_SIZE = 8
+
+# Idle keep-alive connections to the gemd API, shared by the request threads
+_api_pool = []
+_api_pool_lock = threading.Lock()
+
+def _get_api_connection(reuse=True):
+    """Return (conn, reused), taking an idle pooled connection if allowed"""
+    if reuse:
+        with _api_pool_lock:
+            if _api_pool:
+                return _api_pool.pop(), True
+    return http.client.HTTPConnection(API_HOST, API_PORT, timeout=5), False
+
+def _release_api_connection(conn):
+    with _api_pool_lock:
+        if len(_api_pool) < API_POOL_SIZE:
+            _api_pool.append(conn)
+            return
+    conn.close()
+
+def _request_api(endpoint):
     """Fetch data from the gemd API"""
+    path = f"/api/v1/{endpoint}"
     try:
-        url = f"http://127.0.0.1:9876/api/v1/{endpoint}"
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode())
-            return data
-    except (urllib.error.URLError, json.JSONDecodeError, KeyError) as e:
-        logger.warning(f"Failed to fetch {endpoint} from API: {e}")
+        reuse = True
+        while True:
+            conn, reused = _get_api_connection(reuse)
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                # gemd may have closed an idle kept-alive connection; retry that
+                # once on a new socket, but not a fresh connection or a timeout
+                if not reused or isinstance(e, socket.timeout):
+                    raise
+                reuse = False
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                _release_api_connection(conn)
+            break
+        if not 200 <= response.status < 300:
+            raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        # Both parsers accept the raw UTF-8 body, no need to decode it first
+        data = _json_loads(body)
+        return data
+    except (http.client.HTTPException, OSError, ValueError) as e:
+        logger.warning("Failed to fetch %s from API: %s", endpoint, e)
         return None
 
+def _fetch_in_background(endpoint):
+    """Run fetch_api_data on a daemon thread and return a Future for its result.
+
+    Daemon threads don't hold up interpreter exit, unlike ThreadPoolExecutor
+    workers, so a slow lookup can't delay shutdown on SIGTERM.
+    """
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fetch_api_data(endpoint))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+API_CACHE_TTL = 1.0  # seconds
+
+# endpoint -> (expires_at, data), plus the Future of the API call currently
+# running for each endpoint so concurrent misses share its result
+_api_cache = {}
+_api_inflight = {}
+_api_cache_lock = threading.Lock()
+
+def _cached_api_data(endpoint):
+    entry = _api_cache.get(endpoint)
+    if entry and entry[0] > time.monotonic():
+        return entry
+    return None
+
+def fetch_api_data(endpoint):
+    """Fetch data from the gemd API, cached for API_CACHE_TTL seconds"""
+    entry = _cached_api_data(endpoint)
+    if entry:
+        return entry[1]
+
+    with _api_cache_lock:
+        entry = _cached_api_data(endpoint)
+        if entry:
+            return entry[1]
+        future = _api_inflight.get(endpoint)
+        if future is not None:
+            waiting = True
+        else:
+            waiting = False
+            future = _api_inflight[endpoint] = Future()
+    if waiting:
+        return future.result()
+
+    data = None
+    try:
+        data = _request_api(endpoint)
+    finally:
+        with _api_cache_lock:
+            if data is None:
+                # Don't keep serving stale data once the API is failing
+                _api_cache.pop(endpoint, None)
+            else:
+                _api_cache[endpoint] = (time.monotonic() + API_CACHE_TTL, data)
+            del _api_inflight[endpoint]
+        future.set_result(data)
+    return data
+
+_KB = 1 << 10
+_MB = 1 << 20
+_GB = 1 << 30
+
+def format_bytes(bytes_val):
+    if bytes_val >= _GB:
+        return f"{bytes_val / _GB:.1f} GB"
+    elif bytes_val >= _MB:
+        return f"{bytes_val / _MB:.1f} MB"
+    else:
+        return f"{bytes_val / _KB:.1f} KB"
+
+def format_uptime(seconds):
+    days, rem = divmod(seconds, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes = rem // 60
+    if days > 0:
+        return f"{days}d {hours}h {minutes}m"
+    elif hours > 0:
+        return f"{hours}h {minutes}m"
+    else:
+        return f"{minutes}m"
+
 class TestHandler(BaseHTTPRequestHandler):
+    # Drop idle connections so they can't hold a server thread slot forever
+    timeout = 10
+
     def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        
-        self.wfile.write(b'Hello from Gemstone test app!\n')
-        self.wfile.write(f'PID: {os.getpid()}\n'.encode())
-        self.wfile.write(f'Uptime: {time.time() - start_time:.1f}s\n'.encode())
+        # Build the whole body first and send it with a single write
+        buf = bytearray()
+        buf.extend(GREETING)
+        buf.extend(PID_LINE)
+        buf.extend(f'Uptime: {time.time() - start_time:.1f}s\n'.encode())
         
         # Fetch and display API information
-        self.wfile.write(b'\n--- Gemstone Daemon Info ---\n')
+        procs_future = _fetch_in_background('processes')
         system_info = fetch_api_data('system')
+        processes = procs_future.result()
+
+        buf.extend(HDR_INFO)
         if system_info and system_info.get('success'):
             data = system_info.get('data', {})
-            self.wfile.write(f'Version: {data.get("version", "unknown")}\n'.encode())
-            self.wfile.write(f'Process Count: {data.get("process_count", 0)}\n'.encode())
+            # Collect the section as text and encode it once at the end
+            parts = [
+                f'Version: {data.get("version", "unknown")}\n'
+                f'Process Count: {data.get("process_count", 0)}\n'
+            ]
             if 'system_stats' in data:
                 stats = data['system_stats']
                 cpu_percent = stats.get("cpu_percent", 0)
-                self.wfile.write(f'CPU Usage (system): {cpu_percent:.1f}%\n'.encode())
-                
-                # Memory in GB/MB
                 mem_total = stats.get("memory_total", 0)  # bytes
                 mem_used = stats.get("memory_used", 0)    # bytes
-                
-                def format_bytes(bytes_val):
-                    if bytes_val >= 1024**3:  # GB
-                        return f"{bytes_val / 1024**3:.1f} GB"
-                    elif bytes_val >= 1024**2:  # MB
-                        return f"{bytes_val / 1024**2:.1f} MB"
-                    else:  # KB
-                        return f"{bytes_val / 1024:.1f} KB"
-                
-                self.wfile.write(f'Memory Usage: {format_bytes(mem_used)} / {format_bytes(mem_total)}\n'.encode())
-                
-                # Disk usage
                 disk_total = stats.get("disk_total", 0)
                 disk_used = stats.get("disk_used", 0)
                 disk_percent = stats.get("disk_percent", 0)
-                self.wfile.write(f'Disk Usage: {format_bytes(disk_used)} / {format_bytes(disk_total)} ({disk_percent:.1f}%)\n'.encode())
+                parts.append(
+                    f'CPU Usage (system): {cpu_percent:.1f}%\n'
+                    f'Memory Usage: {format_bytes(mem_used)} / {format_bytes(mem_total)}\n'
+                    f'Disk Usage: {format_bytes(disk_used)} / {format_bytes(disk_total)} ({disk_percent:.1f}%)\n'
+                )
                 
                 # Load average
                 load_avg = stats.get("load_average", [])
                 if load_avg and len(load_avg) >= 3:
-                    self.wfile.write(f'Load Average: {load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}\n'.encode())
+                    parts.append(f'Load Average: {load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}\n')
                 
                 # System uptime
                 sys_uptime = stats.get("uptime", 0)
-                def format_uptime(seconds):
-                    days = seconds // 86400
-                    hours = (seconds % 86400) // 3600
-                    minutes = (seconds % 3600) // 60
-                    if days > 0:
-                        return f"{days}d {hours}h {minutes}m"
-                    elif hours > 0:
-                        return f"{hours}h {minutes}m"
-                    else:
-                        return f"{minutes}m"
-                
-                self.wfile.write(f'System Uptime: {format_uptime(sys_uptime)}\n'.encode())
+                parts.append(f'System Uptime: {format_uptime(sys_uptime)}\n')
                 
                 # Timestamp
                 timestamp = stats.get("timestamp", "")
                 if timestamp:
-                    # Parse and format timestamp
-                    try:
-                        from datetime import datetime
-                        # Remove microseconds and timezone for simpler parsing
-                        simple_ts = timestamp.split('.')[0]  # Remove microseconds
-                        if '+' in simple_ts:
-                            simple_ts = simple_ts.split('+')[0]
-                        elif '-' in simple_ts and simple_ts.count('-') > 2:
-                            # Handle timezone offset
-                            parts = simple_ts.rsplit('-', 1)
-                            simple_ts = parts[0]
-                        
-                        dt = datetime.fromisoformat(simple_ts)
-                        formatted_time = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        self.wfile.write(f'Last Updated: {formatted_time}\n'.encode())
-                    except Exception as e:
-                        logger.warning(f"Failed to parse timestamp {timestamp}: {e}")
-                        # Fallback: just show the date/time part
-                        if 'T' in timestamp:
-                            date_part = timestamp.split('T')[0]
-                            time_part = timestamp.split('T')[1].split('.')[0]
-                            self.wfile.write(f'Last Updated: {date_part} {time_part}\n'.encode())
-                        else:
-                            self.wfile.write(f'Last Updated: {timestamp}\n'.encode())
+                    # Drop the fractional seconds and timezone, keep "date time"
+                    m = _TS_RE.match(timestamp)
+                    if m:
+                        parts.append(f'Last Updated: {m.group(1)} {m.group(2)}\n')
+                    else:
+                        logger.warning("Failed to parse timestamp %s", timestamp)
+                        parts.append(f'Last Updated: {timestamp}\n')
+            buf.extend(''.join(parts).encode())
         else:
-            self.wfile.write(b'Unable to fetch system info from API\n')
+            buf.extend(UNAVAIL_SYS)
         
-        self.wfile.write(b'\n--- Managed Processes ---\n')
-        processes = fetch_api_data('processes')
+        buf.extend(HDR_PROCS)
         if processes and processes.get('success'):
             proc_list = processes.get('data', [])
             if proc_list:
-                for proc in proc_list:
-                    self.wfile.write(f'ID: {proc.get("id", "unknown")}, Name: {proc.get("name", "unknown")}, Status: {proc.get("status", "unknown")}\n'.encode())
+                buf.extend(''.join(
+                    f'ID: {proc.get("id", "unknown")}, Name: {proc.get("name", "unknown")}, Status: {proc.get("status", "unknown")}\n'
+                    for proc in proc_list
+                ).encode())
             else:
-                self.wfile.write(b'No processes currently managed\n')
+                buf.extend(NO_PROCS)
         else:
-            self.wfile.write(b'Unable to fetch processes from API\n')
+            buf.extend(UNAVAIL_PROCS)
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-Length', str(len(buf)))
+        self.end_headers()
+        self.wfile.write(buf)
 
     def log_message(self, format, *args):
         # Suppress default HTTP server logs
         pass
 
+class BoundedThreadingHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that caps the number of in-flight request threads"""
+    max_threads = 16
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = threading.BoundedSemaphore(self.max_threads)
+
+    def process_request(self, request, client_address):
+        # Block the accept loop instead of spawning past the limit
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
 def run_server():
     try:
-        server = HTTPServer(('localhost', 9875), TestHandler)
-        logger.info("HTTP server started on http://localhost:9875")
+        # One thread per request so a slow API call doesn't block other clients
+        server = BoundedThreadingHTTPServer(('localhost', 9875), TestHandler)
+        if VERBOSE:
+            logger.info("HTTP server started on http://localhost:9875")
         server.serve_forever()
     except Exception as e:
-        logger.error(f"HTTP server error: {e}")
+        logger.error("HTTP server error: %s", e)
 
 def simulate_work():
-    data = []
+    data = deque(maxlen=10)  # oldest sample is evicted automatically
+    rand = random.random  # bound once, called 10000+ times per tick
     while True:
         for _ in range(10000):
-            random.random() ** 2
+            rand() ** 2
 
-        if random.random() < 0.1:
-            data.append([random.random() for _ in range(1000)])
-            if len(data) > 10:
-                data.pop(0)
+        if rand() < 0.1:
+            data.append([rand() for _ in range(1000)])
 
-        time.sleep(1)
+        if _STOP.wait(1):
+            return
 
 def main():
     logger.info("Gemstone test app started")
-    logger.info(f"PID: {os.getpid()}")
+    if VERBOSE:
+        logger.info("PID: %s", os.getpid())
 
     server_thread = threading.Thread(target=run_server, daemon=True)
     server_thread.start()
@@ -170,14 +340,18 @@ def main():
     work_thread.start()
 
     counter = 0
-    while True:
-        counter += 1
+    try:
+        while True:
+            counter += 1
 
-        if random.random() < 0.05:  # 5% chance
-            logger.warning("Simulating an error (this should trigger auto-restart if enabled)")
-            sys.exit(1)
+            if SIMULATE_CRASHES and random.random() < 0.05:  # 5% chance
+                logger.warning("Simulating an error (this should trigger auto-restart if enabled)")
+                sys.exit(1)
 
-        time.sleep(10)
+            # The signal handler's SystemExit interrupts this wait immediately
+            _STOP.wait(10)
+    finally:
+        _STOP.set()
 
 if __name__ == '__main__':
     start_time = time.time()
@@ -185,6 +359,8 @@ if __name__ == '__main__':
 
     def signal_handler(signum, frame):
         logger.info("Received signal, shutting down gracefully")
+        # Exit via SystemExit rather than _STOP.set(): the handler can run
+        # while this thread holds the Event's lock inside _STOP.wait()
         sys.exit(0)
 
     signal.signal(signal.SIGTERM, signal_handler)
@@ -195,5 +371,5 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("Interrupted by user")
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         sys.exit(1)
\ No newline at end of file